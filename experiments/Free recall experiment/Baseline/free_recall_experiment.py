@@ -1,13 +1,17 @@
 import random
+import string
 import csv
 import time
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from collections import Counter
+from datetime import datetime
+from functools import partial
+from tkinter import ttk, messagebox, filedialog, font as tkfont
 
 # ------------------------------ Config ------------------------------ #
-SIMILAR_POOL = ["B","D","G","P","T","V"]
-DISSIMILAR_POOL = ["K","L","R","Y","Q","H","M","N","Z"]
-DEFAULT_POOL = list(set(SIMILAR_POOL + DISSIMILAR_POOL))
+SIMILAR_POOL = ("B","D","G","P","T","V")
+DISSIMILAR_POOL = ("K","L","R","Y","Q","H","M","N","Z")
+DEFAULT_POOL = SIMILAR_POOL + DISSIMILAR_POOL  # pools are disjoint; fixed order keeps runs reproducible
 
 LIST_LEN_MIN = 10
 LIST_LEN_MAX = 12
@@ -21,31 +25,36 @@ USE_CHUNKS_DEFAULT = True
 CHUNK_SIZE = 3
 INTERCHUNK_GAP_MS = 400  # extra blank between groups when chunked
 
+# Column order of the trial log
+LOG_FIELDS = ("timestamp", "participant", "trial_index", "condition", "similarity", "chunked", "list_items", "response", "n_correct", "proportion_correct", "phonological_confusions", "seed")
+LOG_FLUSH_EVERY = 10  # flush the streamed log to disk every N trials
+
 # Simple phonological confusion map (symmetric)
-PHONO_PAIRS = {("B","P"), ("D","T"), ("G","K"), ("F","S"), ("M","N"), ("V","B"), ("V","F")}
+PHONO_PAIRS = frozenset({("B","P"), ("D","T"), ("G","K"), ("F","S"), ("M","N"), ("V","B"), ("V","F")})
+
+# Letter -> phonological neighbours, built once from PHONO_PAIRS
+PHONO_NEIGHBORS = {}
+for _a, _b in PHONO_PAIRS:
+    PHONO_NEIGHBORS.setdefault(_a, set()).add(_b)
+    PHONO_NEIGHBORS.setdefault(_b, set()).add(_a)
+PHONO_NEIGHBORS = {k: frozenset(v) for k, v in PHONO_NEIGHBORS.items()}
+_EMPTY = frozenset()
+
+# Translation table deleting every ASCII character outside A-Z (non-ASCII is dropped by encode)
+_DEL_NON_AZ = str.maketrans('', '', ''.join(chr(c) for c in range(128) if chr(c) not in string.ascii_uppercase))
 
 # ------------------------------ Helpers ------------------------------ #
 def overlaps_ignoring_order(target_letters, resp_letters):
     """Return count of correctly recalled unique items, ignoring order and duplicates in response."""
-    t = list(target_letters)
-    count = 0
-    for r in resp_letters:
-        if r in t:
-            t.remove(r)
-            count += 1
-    return count
+    return sum((Counter(target_letters) & Counter(resp_letters)).values())
 
 def estimate_phono_confusions(target_letters, resp_letters):
     """Heuristic: count responses that are not in target but are a phonological neighbor of some target."""
     tset = set(target_letters)
-    conf = 0
-    for r in resp_letters:
-        if r not in tset:
-            for a,b in PHONO_PAIRS:
-                if (r==a and b in tset) or (r==b and a in tset):
-                    conf += 1
-                    break
-    return conf
+    extras = [r for r in resp_letters if r not in tset]
+    if not extras:
+        return 0
+    return sum(1 for r in extras if not PHONO_NEIGHBORS.get(r, _EMPTY).isdisjoint(tset))
 
 # ------------------------------ App ------------------------------ #
 class FreeRecallApp(tk.Tk):
@@ -62,29 +71,44 @@ class FreeRecallApp(tk.Tk):
         self.similarity = tk.StringVar(value="mixed")  # similar|dissimilar|mixed
         self.chunked = tk.BooleanVar(value=USE_CHUNKS_DEFAULT)
         self.n_trials = tk.IntVar(value=20)
+        self.seed = tk.StringVar(value="")  # blank = fresh random seed per block
 
         self.trial_index = 0
         self.letters = []
         self.response = ""
-        self.log_rows = []
+        self._log_file = None
+        self._log_writer = None
+        self._log_path = ""
+        self._block_meta = {}
+        self._n_trials = 0
+
+        # Per-app RNG (seeded per block) with its methods bound once
+        self._rng = random.Random()
+        self._sample = self._rng.sample
+        self._randint = self._rng.randint
+        self._choice = self._rng.choice
 
         # UI
         self.center = tk.Frame(self, bg="white")
         self.center.place(relx=0.5, rely=0.5, anchor="center")
-        self.label = tk.Label(self.center, text="", font=("Helvetica", 48), bg="white")
+        # Trial widgets are created once and only packed/unpacked between phases
+        self._big_font = tkfont.Font(family="Helvetica", size=48)
+        self._fixation_font = tkfont.Font(family="Helvetica", size=72)
+        self.label = tk.Label(self.center, text="", font=self._big_font, bg="white")
         self.sub = tk.Label(self.center, text="", font=("Helvetica", 16), bg="white")
         self.entry = tk.Entry(self.center, font=("Consolas", 24), width=40, justify="center")
         self.btn = ttk.Button(self.center, text="", command=self._on_button)
+        self._trial_widgets = (self.label, self.sub, self.entry, self.btn)
 
         self._build_menu()
 
-        self.bind("<Return>", lambda e: self._on_enter())
-        self.bind("<BackSpace>", self._block_backspace)
+        self.bind("<Return>", self._on_enter)
+        # Backspace is disabled only in the (persistent) recall entry
+        self.entry.bind("<BackSpace>", lambda e: "break")
 
     # -------------------------- Menu -------------------------- #
     def _build_menu(self):
-        for w in self.center.winfo_children():
-            w.destroy()
+        self._clear_center()
         tk.Label(self.center, text="Free Recall Experiment", font=("Helvetica", 28, "bold"), bg="white").pack(pady=8)
 
         frm = tk.Frame(self.center, bg="white")
@@ -110,8 +134,11 @@ class FreeRecallApp(tk.Tk):
         tk.Spinbox(frm, from_=1, to=500, textvariable=self.n_trials, width=8, justify="center").grid(row=row, column=1, padx=6, pady=4)
         row += 1
 
+        tk.Label(frm, text="Seed (optional):", bg="white").grid(row=row, column=0, sticky="e", padx=6, pady=4)
+        tk.Entry(frm, textvariable=self.seed, width=12, justify="center").grid(row=row, column=1, padx=6, pady=4)
+        row += 1
+
         ttk.Button(self.center, text="Start", command=self._start_block).pack(pady=16)
-        ttk.Button(self.center, text="Save log…", command=self._save_csv).pack(pady=4)
 
         info = (
             "Timing: fixation 500 ms → letters 800 ms on + 200 ms blank → retention 1000 ms → recall\n"
@@ -121,14 +148,42 @@ class FreeRecallApp(tk.Tk):
         tk.Label(self.center, text=info, font=("Helvetica", 11), fg="#333", bg="white").pack(pady=8)
 
     def _start_block(self):
+        seed_text = self.seed.get().strip()
+        if seed_text and not seed_text.isdecimal():
+            messagebox.showwarning("Invalid seed", "Seed must be a non-negative integer, or blank for a random seed.")
+            return
+        # Read and validate every setting before the log file is created, so a bad
+        # value never leaves an open handle or a header-only CSV behind
+        try:
+            n_trials = self.n_trials.get()
+        except tk.TclError:
+            n_trials = 0
+        if n_trials < 1:
+            messagebox.showwarning("Invalid trials", "Number of trials must be a positive whole number.")
+            return
+        seed = int(seed_text) if seed_text else random.randrange(2**32)
+        # Settings are fixed for the whole block; read the Tk variables once
+        block_meta = {
+            "participant": self.participant.get(),
+            "condition": self.condition.get(),
+            "similarity": self.similarity.get(),
+            "chunked": int(self.chunked.get()),
+            "seed": seed,
+        }
+        if not self._open_log():
+            return
+        # Seed the app's own RNG so a block's lists can be regenerated from the logged seed
+        self._rng.seed(seed)
         self.trial_index = 0
-        self.log_rows.clear()
+        self._block_meta = block_meta
+        self._n_trials = n_trials
         self._next_trial()
 
     # -------------------------- Trial flow -------------------------- #
     def _next_trial(self):
-        if self.trial_index >= self.n_trials.get():
-            messagebox.showinfo("Block complete", f"Completed {self.n_trials.get()} trials. Save log to export CSV.")
+        if self.trial_index >= self._n_trials:
+            self._close_log()
+            messagebox.showinfo("Block complete", f"Completed {self._n_trials} trials. Data saved to\n{self._log_path}")
             self._build_menu()
             return
         self.trial_index += 1
@@ -138,88 +193,96 @@ class FreeRecallApp(tk.Tk):
 
     def _show_fixation(self):
         self._clear_center()
-        self.label.config(text="+", font=("Helvetica", 72))
         self.label.pack(pady=40)
-        cond = self.condition.get()
+        self.sub.pack()
+        cond = self._block_meta["condition"]
         if cond == "suppression":
-            self.sub.config(text=f"Trial {self.trial_index}/{self.n_trials.get()} — Whisper 'the-the-the' @120 BPM now, keep going until recall ends.")
+            prompt = "Whisper 'the-the-the' @120 BPM now, keep going until recall ends."
         elif cond == "tapping":
-            self.sub.config(text=f"Trial {self.trial_index}/{self.n_trials.get()} — Tap your index finger @120 BPM now, continue until recall ends.")
+            prompt = "Tap your index finger @120 BPM now, continue until recall ends."
         else:
-            self.sub.config(text=f"Trial {self.trial_index}/{self.n_trials.get()} — Focus on the cross.")
-        self.sub.pack()
+            prompt = "Focus on the cross."
+        self.label.config(text="+", font=self._fixation_font)
+        self.sub.config(text=f"Trial {self.trial_index}/{self._n_trials} — {prompt}")
         self.after(FIXATION_MS, self._show_sequence)
 
     def _show_sequence(self):
         self._clear_center()
         self.label.pack(pady=40)
         self.sub.pack()
-        chunked = self.chunked.get()
-        letters = list(self.letters)
-
-        def present_next(i=0):
-            if i >= len(letters):
-                self.after(RETENTION_MS, self._recall_screen)
-                return
-            self.label.config(text=letters[i])
-            gap = BLANK_MS
-            # add inter-chunk gap
-            if chunked and i>0 and (i % CHUNK_SIZE == 0):
-                gap = INTERCHUNK_GAP_MS
-            self.after(ON_MS, lambda: self._blank_then_next(i, gap, present_next))
-        present_next(0)
-
-    def _blank_then_next(self, i, blank_ms, cont_fn):
-        self.label.config(text="")
-        self.after(blank_ms, lambda: cont_fn(i+1))
+        self.label.config(text="", font=self._big_font)
+        self.sub.config(text="")
+        chunked = self._block_meta["chunked"]
+
+        # Build the whole presentation as absolute (ms, text) offsets, then schedule it at once
+        # Blank after every letter; letters i > 0 with i % CHUNK_SIZE == 0 are followed by the
+        # inter-chunk gap (original protocol: first group CHUNK_SIZE + 1 letters, then CHUNK_SIZE)
+        gaps = [BLANK_MS] * len(self.letters)
+        if chunked:
+            for i in range(CHUNK_SIZE, len(gaps), CHUNK_SIZE):
+                gaps[i] = INTERCHUNK_GAP_MS
+        events = []
+        t = 0
+        for ch, gap in zip(self.letters, gaps):
+            events.append((t, ch))
+            t += ON_MS
+            events.append((t, ""))
+            t += gap
+        for t_ms, text in events:
+            self.after(t_ms, partial(self.label.config, text=text))
+        self.after(t + RETENTION_MS, self._recall_screen)
 
     def _recall_screen(self):
         self._clear_center()
-        self.label.config(text="Type all letters you remember (any order)")
+        # Pack everything first, then configure, so Tk does a single geometry pass
         self.label.pack(pady=20)
-        self.entry.delete(0, tk.END)
         self.entry.pack(pady=10)
-        self.entry.focus_set()
-        self.sub.config(text="No backspace. Use single letters (A–Z) without spaces. Press Enter to submit.")
         self.sub.pack(pady=6)
-        self.btn.config(text="Submit", command=self._submit_response)
         self.btn.pack(pady=10)
+        self.label.config(text="Type all letters you remember (any order)", font=self._big_font)
+        self.sub.config(text="No backspace. Use single letters (A–Z) without spaces. Press Enter to submit.")
+        self.btn.config(text="Submit", command=self._submit_response)
+        self.entry.delete(0, tk.END)
+        self.entry.focus_set()
 
     # -------------------------- Data & scoring -------------------------- #
     def _submit_response(self):
         self._on_enter()
 
-    def _on_enter(self):
+    def _on_enter(self, event=None):
         if not self.entry.winfo_ismapped():
             return
-        resp = self.entry.get().strip().upper().replace(" ", "")
         # keep only A-Z
-        resp = ''.join([c for c in resp if 'A' <= c <= 'Z'])
+        resp = self.entry.get().upper().encode("ascii", "ignore").decode("ascii").translate(_DEL_NON_AZ)
         targ = list(self.letters)
         resp_list = list(resp)
         n_correct = overlaps_ignoring_order(targ, resp_list)
         prop_correct = n_correct / len(targ)
         phono_conf = estimate_phono_confusions(targ, resp_list)
 
-        row = {
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "participant": self.participant.get(),
-            "trial_index": self.trial_index,
-            "condition": self.condition.get(),
-            "similarity": self.similarity.get(),
-            "chunked": int(self.chunked.get()),
-            "list_items": ''.join(self.letters),
-            "response": resp,
-            "n_correct": n_correct,
-            "proportion_correct": f"{prop_correct:.3f}",
-            "phonological_confusions": phono_conf,
-        }
-        self.log_rows.append(row)
+        meta = self._block_meta
+        row = (
+            datetime.now().isoformat(sep=" ", timespec="seconds"),
+            meta["participant"],
+            self.trial_index,
+            meta["condition"],
+            meta["similarity"],
+            meta["chunked"],
+            ''.join(self.letters),
+            resp,
+            n_correct,
+            f"{prop_correct:.3f}",
+            phono_conf,
+            meta["seed"],
+        )
+        self._log_writer.writerow(row)
+        if self.trial_index % LOG_FLUSH_EVERY == 0:
+            self._log_file.flush()
         self._next_trial()
 
     def _make_list(self):
-        L = random.randint(LIST_LEN_MIN, LIST_LEN_MAX)
-        sim = self.similarity.get()
+        L = self._randint(LIST_LEN_MIN, LIST_LEN_MAX)
+        sim = self._block_meta["similarity"]
         if sim == "similar":
             pool = SIMILAR_POOL
         elif sim == "dissimilar":
@@ -228,48 +291,50 @@ class FreeRecallApp(tk.Tk):
             pool = DEFAULT_POOL
         # sample without replacement; if pool shorter than length, extend by sampling with replacement after unique exhaustion
         if L <= len(pool):
-            return random.sample(pool, L)
+            return self._sample(pool, L)
         else:
-            base = random.sample(pool, len(pool))
-            extra = [random.choice(pool) for _ in range(L - len(pool))]
+            base = self._sample(pool, len(pool))
+            extra = [self._choice(pool) for _ in range(L - len(pool))]
             # avoid immediate repeats
             letters = base + extra
             for i in range(1, len(letters)):
                 if letters[i] == letters[i-1]:
-                    letters[i] = random.choice([x for x in pool if x != letters[i-1]])
+                    # two distinct draws: at least one differs from prev, uniformly over the rest
+                    a, b = self._sample(pool, 2)
+                    letters[i] = a if a != letters[i-1] else b
             return letters
 
-    def _save_csv(self):
-        if not self.log_rows:
-            messagebox.showwarning("No data", "No trials to save yet.")
-            return
+    def _open_log(self):
+        """Ask for the output CSV and open it for streaming; return False if cancelled."""
         fname = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files","*.csv")], initialfile=f"free_recall_{self.participant.get()}_{int(time.time())}.csv")
         if not fname:
-            return
-        fieldnames = list(self.log_rows[0].keys())
-        with open(fname, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(self.log_rows)
-        messagebox.showinfo("Saved", f"Data saved to\n{fname}")
+            return False
+        # Never leak a log left open by an earlier block
+        self._close_log()
+        self._log_file = open(fname, "w", newline="", encoding="utf-8", buffering=1 << 16)
+        self._log_writer = csv.writer(self._log_file, lineterminator="\n")
+        self._log_writer.writerow(LOG_FIELDS)
+        self._log_path = fname
+        return True
+
+    def _close_log(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+            self._log_writer = None
 
     def _save_before_exit(self):
-        if self.log_rows:
-            if messagebox.askyesno("Save data?", "You have unsaved data. Save CSV before exiting?"):
-                self._save_csv()
+        # Trials are already streamed to disk; flush and close whatever is open
+        self._close_log()
         self.destroy()
 
-    def _block_backspace(self, event):
-        if self.entry.winfo_ismapped():
-            return "break"
-
     def _clear_center(self):
+        # Hide the persistent trial widgets; anything else (menu, countdown) is transient
         for w in self.center.winfo_children():
-            w.destroy()
-        self.label = tk.Label(self.center, text="", font=("Helvetica", 48), bg="white")
-        self.sub = tk.Label(self.center, text="", font=("Helvetica", 16), bg="white")
-        self.entry = tk.Entry(self.center, font=("Consolas", 24), width=40, justify="center")
-        self.btn = ttk.Button(self.center, text="", command=self._on_button)
+            if w in self._trial_widgets:
+                w.pack_forget()
+            else:
+                w.destroy()
 
     def _on_button(self):
         pass
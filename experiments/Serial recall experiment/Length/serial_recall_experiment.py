@@ -3,10 +3,12 @@ import string
 import csv
 import time
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from datetime import datetime
+from functools import partial
+from tkinter import ttk, messagebox, filedialog, font as tkfont
 
 # ------------------------------ Config ------------------------------ #
-POOL = ["B","D","G","K","L","M","P","Q","R","S","T","V","Y","Z"]  # consonant pool
+POOL = ("B","D","G","K","L","M","P","Q","R","S","T","V","Y","Z")  # consonant pool
 # LIST_LENGTH will be randomly chosen from 4-9 for each experiment run
 FIXATION_MS = 500
 IMMEDIATE_BLANK_MS = 1000
@@ -21,6 +23,10 @@ RATES = {
     "fast": {"on_ms": 500, "blank_ms": 0},     # ~2 Hz
 }
 
+# Column order of the trial log
+LOG_FIELDS = ("timestamp", "participant", "trial_index", "rate", "post_phase", "chunking", "list_length", "list_items", "response", "proportion_correct_in_position", "per_position_binary", "seed")
+LOG_FLUSH_EVERY = 10  # flush the streamed log to disk every N trials
+
 # ------------------------------ App ------------------------------ #
 class SerialRecallApp(tk.Tk):
     def __init__(self):
@@ -35,33 +41,46 @@ class SerialRecallApp(tk.Tk):
         self.rate = tk.StringVar(value="slow")
         self.post_phase = tk.StringVar(value="immediate")  # immediate|pause|wm
         self.n_trials = tk.IntVar(value=20)
+        self.seed = tk.StringVar(value="")  # blank = fresh random seed per block
         self.chunking = tk.BooleanVar(value=False)  # Chunking option
         self.trial_index = 0
         self.letters = []
         self.response = ""
         self.phase = "menu"
-        self.log_rows = []
+        self._log_file = None
+        self._log_writer = None
+        self._log_path = ""
+        self._block_meta = {}
+        self._n_trials = 0
+
+        # Per-app RNG (seeded per block) with its methods bound once
+        self._rng = random.Random()
+        self._sample = self._rng.sample
         self.list_length = 0  # Will be set randomly for each trial
 
         # UI containers
         self.center = tk.Frame(self, bg="white")
         self.center.place(relx=0.5, rely=0.5, anchor="center")
 
-        self.label = tk.Label(self.center, text="", font=("Helvetica", 48), bg="white")
+        # Trial widgets are created once and only packed/unpacked between phases
+        self._big_font = tkfont.Font(family="Helvetica", size=48)
+        self._fixation_font = tkfont.Font(family="Helvetica", size=72)
+        self.label = tk.Label(self.center, text="", font=self._big_font, bg="white")
         self.sub = tk.Label(self.center, text="", font=("Helvetica", 16), bg="white")
         self.entry = tk.Entry(self.center, font=("Consolas", 24), width=32, justify="center")
         self.btn = ttk.Button(self.center, text="", command=self._on_button)
+        self._trial_widgets = (self.label, self.sub, self.entry, self.btn)
 
         self._build_menu()
 
         # key bindings
-        self.bind("<Return>", lambda e: self._on_enter())
-        self.bind("<BackSpace>", self._block_backspace)
+        self.bind("<Return>", self._on_enter)
+        # Backspace is disabled only in the (persistent) recall entry
+        self.entry.bind("<BackSpace>", lambda e: "break")
 
     # -------------------------- Screens -------------------------- #
     def _build_menu(self):
-        for w in self.center.winfo_children():
-            w.destroy()
+        self._clear_center()
 
         tk.Label(self.center, text="Serial Recall Experiment", font=("Helvetica", 28, "bold"), bg="white").pack(pady=8)
 
@@ -82,8 +101,10 @@ class SerialRecallApp(tk.Tk):
         tk.Label(frm, text="Chunking:", bg="white").grid(row=4, column=0, sticky="e", padx=6, pady=4)
         tk.Checkbutton(frm, variable=self.chunking, bg="white").grid(row=4, column=1, sticky="w", padx=6, pady=4)
 
+        tk.Label(frm, text="Seed (optional):", bg="white").grid(row=5, column=0, sticky="e", padx=6, pady=4)
+        tk.Entry(frm, textvariable=self.seed, width=12, justify="center").grid(row=5, column=1, padx=6, pady=4)
+
         ttk.Button(self.center, text="Start", command=self._start_block).pack(pady=16)
-        ttk.Button(self.center, text="Save log…", command=self._save_csv).pack(pady=4)
 
         info = (
             "Rate slow = 800 ms on + 200 ms blank (≈1 Hz)\n"
@@ -94,24 +115,54 @@ class SerialRecallApp(tk.Tk):
         tk.Label(self.center, text=info, font=("Helvetica", 11), fg="#333", bg="white").pack(pady=8)
 
     def _start_block(self):
+        seed_text = self.seed.get().strip()
+        if seed_text and not seed_text.isdecimal():
+            messagebox.showwarning("Invalid seed", "Seed must be a non-negative integer, or blank for a random seed.")
+            return
+        # Read and validate every setting before the log file is created, so a bad
+        # value never leaves an open handle or a header-only CSV behind
+        try:
+            n_trials = self.n_trials.get()
+        except tk.TclError:
+            n_trials = 0
+        if n_trials < 1:
+            messagebox.showwarning("Invalid trials", "Number of trials must be a positive whole number.")
+            return
+        seed = int(seed_text) if seed_text else random.randrange(2**32)
+        # Settings are fixed for the whole block; read the Tk variables once
+        block_meta = {
+            "participant": self.participant.get(),
+            "rate": self.rate.get(),
+            "post_phase": self.post_phase.get(),
+            "seed": seed,
+            "chunking": self.chunking.get(),
+        }
+        timing = RATES[block_meta["rate"]]
+        if not self._open_log():
+            return
+        # Seed the app's own RNG so a block's lists can be regenerated from the logged seed
+        self._rng.seed(seed)
         self.trial_index = 0
-        self.log_rows.clear()
+        self._block_meta = block_meta
+        self._n_trials = n_trials
+        self._on_ms, self._blank_ms = timing["on_ms"], timing["blank_ms"]
+        # Draw every trial's list length up front: fixed 9 for chunking (3 complete
+        # chunks of 3 letters each), otherwise a random length of 4-9 per trial
+        if self._block_meta["chunking"]:
+            self._lengths = [9] * self._n_trials
+        else:
+            self._lengths = self._rng.choices(range(4, 10), k=self._n_trials)
         self._next_trial()
 
     def _next_trial(self):
-        if self.trial_index >= self.n_trials.get():
-            messagebox.showinfo("Block complete", f"Completed {self.n_trials.get()} trials. Choose Save log… to export CSV.")
+        if self.trial_index >= self._n_trials:
+            self._close_log()
+            messagebox.showinfo("Block complete", f"Completed {self._n_trials} trials. Data saved to\n{self._log_path}")
             self._build_menu()
             return
 
+        self.list_length = self._lengths[self.trial_index]
         self.trial_index += 1
-        # Set list length based on chunking setting
-        if self.chunking.get():
-            # Use fixed length of 9 for chunking (3 complete chunks of 3 letters each)
-            self.list_length = 9
-        else:
-            # Generate a new random list length for this trial (4-9)
-            self.list_length = random.randint(4, 9)
         self.letters = self._sample_letters()
         self.response = ""
         self._show_fixation()
@@ -119,70 +170,48 @@ class SerialRecallApp(tk.Tk):
     # ------------------------ Trial phases ------------------------ #
     def _show_fixation(self):
         self._clear_center()
-        self.label.config(text="+", font=("Helvetica", 72))
         self.label.pack(pady=40)
-        self.sub.config(text=f"Trial {self.trial_index}/{self.n_trials.get()} — Participant {self.participant.get()}\nFocus on the cross.")
         self.sub.pack()
+        self.label.config(text="+", font=self._fixation_font)
+        self.sub.config(text=f"Trial {self.trial_index}/{self._n_trials} — Participant {self._block_meta['participant']}\nFocus on the cross.")
         self.after(FIXATION_MS, self._show_sequence)
 
     def _show_sequence(self):
         self._clear_center()
         self.label.pack(pady=40)
         self.sub.pack()
+        self.label.config(text="", font=self._big_font)
         self.sub.config(text="Remember the letters in order.")
-        timing = RATES[self.rate.get()]
-        on_ms = timing["on_ms"]
-        blank_ms = timing["blank_ms"]
+        on_ms = self._on_ms
+        blank_ms = self._blank_ms
 
-        if self.chunking.get():
+        if self._block_meta["chunking"]:
             # Present letters in chunks of CHUNK_SIZE
-            self._present_chunked(seq=list(self.letters), on_ms=on_ms, blank_ms=blank_ms)
+            seq = [' '.join(self.letters[i:i+CHUNK_SIZE]) for i in range(0, len(self.letters), CHUNK_SIZE)]
         else:
             # Present letters one by one (original behavior)
             seq = list(self.letters)
-            def present_next(i=0):
-                if i >= len(seq):
-                    # Go to post-list phase
-                    self.after(0, self._post_list_phase)
-                    return
-                self.label.config(text=seq[i])
-                self.after(on_ms, lambda: self._blank_then_next(i, blank_ms, present_next))
-            present_next(0)
-
-    def _blank_then_next(self, i, blank_ms, cont_fn):
-        self.label.config(text="")
-        if blank_ms > 0:
-            self.after(blank_ms, lambda: cont_fn(i+1))
-        else:
-            cont_fn(i+1)
-
-    def _present_chunked(self, seq, on_ms, blank_ms):
-        """Present letters in chunks of CHUNK_SIZE"""
-        chunks = []
-        for i in range(0, len(seq), CHUNK_SIZE):
-            chunk = seq[i:i+CHUNK_SIZE]
-            chunks.append(' '.join(chunk))
-        
-        def present_chunk(chunk_idx=0):
-            if chunk_idx >= len(chunks):
-                # Go to post-list phase
-                self.after(0, self._post_list_phase)
-                return
-            self.label.config(text=chunks[chunk_idx])
-            self.after(on_ms, lambda: self._blank_then_next(chunk_idx, blank_ms, present_chunk))
-        present_chunk(0)
+
+        # Schedule every on/blank transition up front at absolute offsets
+        t = 0
+        for item in seq:
+            self.after(t, partial(self.label.config, text=item))
+            t += on_ms
+            self.after(t, partial(self.label.config, text=""))
+            t += blank_ms
+        # Go to post-list phase
+        self.after(t, self._post_list_phase)
 
     def _post_list_phase(self):
-        phase = self.post_phase.get()
+        phase = self._block_meta["post_phase"]
         self._clear_center()
         self.label.pack(pady=40)
         self.sub.pack()
         if phase == "immediate":
-            self.label.config(text=" ")
+            self.label.config(text=" ", font=self._big_font)
             self.sub.config(text="Prepare to recall…")
             self.after(IMMEDIATE_BLANK_MS, self._recall_screen)
         elif phase == "pause":
-            self.label.config(text=" ")
             self._countdown(PAUSE_MS, headline="Pause", subtitle="Stay quiet. Do not rehearse aloud.", callback=self._recall_screen)
         elif phase == "wm":
             # WM task: on-screen prompt to count backwards aloud by 3s
@@ -192,101 +221,104 @@ class SerialRecallApp(tk.Tk):
 
     def _recall_screen(self):
         self._clear_center()
-        self.label.config(text="Type the letters in order")
+        # Pack everything first, then configure, so Tk does a single geometry pass
         self.label.pack(pady=20)
-        self.entry.delete(0, tk.END)
         self.entry.pack(pady=10)
-        self.entry.focus_set()
-        self.sub.config(text="Press Enter to submit. Backspace is disabled; use '?' if unsure.")
         self.sub.pack(pady=6)
-        self.btn.config(text="Submit", command=self._submit_response)
         self.btn.pack(pady=10)
+        self.label.config(text="Type the letters in order", font=self._big_font)
+        self.sub.config(text="Press Enter to submit. Backspace is disabled; use '?' if unsure.")
+        self.btn.config(text="Submit", command=self._submit_response)
+        self.entry.delete(0, tk.END)
+        self.entry.focus_set()
 
     # ------------------------ Helpers ------------------------ #
     def _countdown(self, duration_ms, headline="", subtitle="", callback=None):
-        self.label.config(text=headline)
+        self.label.config(text=headline, font=self._big_font)
         self.sub.config(text=f"{subtitle}\n")
-        countdown_lbl = tk.Label(self.center, text="", font=("Helvetica", 28), bg="white")
+        seconds = -(-duration_ms // 1000)  # whole seconds remaining, rounded up
+        countdown_lbl = tk.Label(self.center, text=f"{seconds} s", font=("Helvetica", 28), bg="white")
         countdown_lbl.pack(pady=6)
 
-        start = time.time()
-        def tick():
-            elapsed = int((time.time() - start) * 1000)
-            remain = max(0, duration_ms - elapsed)
-            countdown_lbl.config(text=f"{remain//1000 + (1 if remain % 1000 else 0)} s")
-            if remain > 0:
-                self.after(50, tick)
-            else:
-                countdown_lbl.destroy()
-                if callback:
-                    callback()
-        tick()
+        # The label only changes on second boundaries, so schedule exactly those updates
+        for remain in range(seconds - 1, 0, -1):
+            self.after(duration_ms - remain * 1000, partial(countdown_lbl.config, text=f"{remain} s"))
+        self.after(duration_ms, partial(self._end_countdown, countdown_lbl, callback))
+
+    def _end_countdown(self, countdown_lbl, callback):
+        countdown_lbl.destroy()
+        if callback:
+            callback()
 
     def _submit_response(self):
         self._on_enter()
 
-    def _on_enter(self):
+    def _on_enter(self, event=None):
         if not self.entry.winfo_ismapped():
             return
         resp = self.entry.get().strip().upper().replace(" ", "")
         self.response = resp
         acc_prop, per_pos = self._score(self.letters, resp)
-        row = {
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "participant": self.participant.get(),
-            "trial_index": self.trial_index,
-            "rate": self.rate.get(),
-            "post_phase": self.post_phase.get(),
-            "chunking": self.chunking.get(),
-            "list_length": self.list_length,
-            "list_items": ''.join(self.letters),
-            "response": resp,
-            "proportion_correct_in_position": f"{acc_prop:.3f}",
-            "per_position_binary": ''.join(str(int(x)) for x in per_pos),
-        }
-        self.log_rows.append(row)
+        meta = self._block_meta
+        row = (
+            datetime.now().isoformat(sep=" ", timespec="seconds"),
+            meta["participant"],
+            self.trial_index,
+            meta["rate"],
+            meta["post_phase"],
+            meta["chunking"],
+            self.list_length,
+            ''.join(self.letters),
+            resp,
+            f"{acc_prop:.3f}",
+            ''.join('01'[x] for x in per_pos),
+            meta["seed"],
+        )
+        self._log_writer.writerow(row)
+        if self.trial_index % LOG_FLUSH_EVERY == 0:
+            self._log_file.flush()
         self._next_trial()
 
     def _sample_letters(self):
-        return random.sample(POOL, self.list_length)
+        return self._sample(POOL, self.list_length)
 
     def _score(self, letters, resp):
-        # Compare per position up to list_length (pad response with '-')
-        resp_list = list(resp)
-        correct_flags = []
-        for i, target in enumerate(letters):
-            got = resp_list[i] if i < len(resp_list) else None
-            correct_flags.append(got == target)
-        acc = sum(correct_flags) / len(letters)
-        return acc, correct_flags
-
-    def _save_csv(self):
-        if not self.log_rows:
-            messagebox.showwarning("No data", "No trials to save yet.")
-            return
+        # Compare per position up to list_length (missing positions count as wrong)
+        correct_flags = [a == b for a, b in zip(letters, resp)]
+        correct_flags.extend([False] * (len(letters) - len(correct_flags)))
+        return sum(correct_flags) / len(letters), correct_flags
+
+    def _open_log(self):
+        """Ask for the output CSV and open it for streaming; return False if cancelled."""
         fname = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files","*.csv")], initialfile=f"serial_recall_{self.participant.get()}_{int(time.time())}.csv")
         if not fname:
-            return
-        with open(fname, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=list(self.log_rows[0].keys()))
-            writer.writeheader()
-            for r in self.log_rows:
-                writer.writerow(r)
-        messagebox.showinfo("Saved", f"Data saved to\n{fname}")
-
-    def _block_backspace(self, event):
-        # Disable backspace during recall to match spec
-        if self.entry.winfo_ismapped():
-            return "break"
+            return False
+        # Never leak a log left open by an earlier block
+        self._close_log()
+        self._log_file = open(fname, "w", newline="", encoding="utf-8", buffering=1 << 16)
+        self._log_writer = csv.writer(self._log_file, lineterminator="\n")
+        self._log_writer.writerow(LOG_FIELDS)
+        self._log_path = fname
+        return True
+
+    def _close_log(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+            self._log_writer = None
+
+    def _save_before_exit(self):
+        # Trials are already streamed to disk; flush and close whatever is open
+        self._close_log()
+        self.destroy()
 
     def _clear_center(self):
+        # Hide the persistent trial widgets; anything else (menu, countdown) is transient
         for w in self.center.winfo_children():
-            w.destroy()
-        # recreate common widgets
-        self.label = tk.Label(self.center, text="", font=("Helvetica", 48), bg="white")
-        self.sub = tk.Label(self.center, text="", font=("Helvetica", 16), bg="white")
-        self.entry = tk.Entry(self.center, font=("Consolas", 24), width=32, justify="center")
-        self.btn = ttk.Button(self.center, text="", command=self._on_button)
+            if w in self._trial_widgets:
+                w.pack_forget()
+            else:
+                w.destroy()
 
     def _on_button(self):
         # placeholder for button actions assigned elsewhere
@@ -295,4 +327,5 @@ class SerialRecallApp(tk.Tk):
 
 if __name__ == "__main__":
     app = SerialRecallApp()
+    app.protocol("WM_DELETE_WINDOW", app._save_before_exit)
     app.mainloop()
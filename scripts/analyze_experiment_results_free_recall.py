@@ -5,65 +5,179 @@ Creates plots specifically for free recall experiments.
 """
 
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # batch rendering to PNG only; no GUI windows
 import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
+import os
 from pathlib import Path
-import glob
+from concurrent.futures import ThreadPoolExecutor
 import warnings
 warnings.filterwarnings('ignore')
 
-# Set style for better-looking plots
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+# seaborn's "husl" palette (6 colours), inlined so seaborn itself isn't imported
+HUSL_PALETTE = ['#f77189', '#bb9832', '#50b131', '#36ada4', '#3ba3ec', '#e866f4']
+
+# The parts of the 'seaborn-v0_8' (darkgrid) style these plots actually show,
+# set directly rather than loading and applying the whole style sheet
+PLOT_RC = {
+    'axes.facecolor': '#EAEAF2',
+    'axes.edgecolor': 'white',
+    'axes.linewidth': 0,
+    'axes.grid': True,
+    'axes.axisbelow': True,
+    'axes.labelcolor': '.15',
+    'axes.prop_cycle': plt.cycler(color=HUSL_PALETTE),
+    'grid.color': 'white',
+    'grid.linestyle': '-',
+    'grid.linewidth': 1,
+    'text.color': '.15',
+    'xtick.color': '.15',
+    'ytick.color': '.15',
+    'xtick.major.size': 0,
+    'ytick.major.size': 0,
+    'xtick.major.pad': 7,
+    'ytick.major.pad': 7,
+    'xtick.labelsize': 10,
+    'ytick.labelsize': 10,
+    'legend.fontsize': 10,
+    'legend.frameon': False,
+    'lines.linewidth': 1.75,
+    'lines.markeredgewidth': 0,
+    'lines.solid_capstyle': 'round',
+    'patch.linewidth': 0.3,
+}
+
+# Output resolution for saved PNGs; set PLOT_DPI=300 for print-quality figures
+PLOT_DPI = int(os.environ.get('PLOT_DPI', '150'))
+
+# Only the columns the analysis consumes, with explicit dtypes (skips dtype inference)
+FREE_DTYPES = {'experiment_name': 'category', 'proportion_correct': 'float32'}
+
+# Above this many rows the per-experiment summary switches from pandas' hash
+# groupby to a single bincount sweep over the categorical codes
+GROUP_STATS_MIN_ROWS = 1_000_000
 
 def get_project_root():
     """Get the project root directory."""
     return Path(__file__).parent.parent
 
+def read_combined_csv(file_path):
+    """
+    Read a combined CSV, memoized as a binary pickle sidecar in combined_data/.cache.
+    
+    The sidecar is reused while it is newer than both the CSV and this script,
+    so editing either one transparently invalidates it. The cache is best-effort:
+    if it cannot be read or written, the CSV is simply parsed as usual.
+    """
+    cache_dir = file_path.parent / ".cache"
+    cache_file = cache_dir / f"{file_path.stem}.pkl"
+    source_mtime = max(file_path.stat().st_mtime, Path(__file__).stat().st_mtime)
+    
+    try:
+        if cache_file.stat().st_mtime >= source_mtime:
+            return pd.read_pickle(cache_file)
+    except Exception:
+        # Missing, or unreadable (e.g. pickled by another pandas version): fall back to the CSV
+        pass
+    
+    df = pd.read_csv(file_path, engine='c', usecols=lambda col: col in FREE_DTYPES, dtype=FREE_DTYPES)
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        df.to_pickle(cache_file)
+    except OSError:
+        # e.g. a read-only data directory; the parsed frame is still good
+        pass
+    return df
+
+def load_combined_csv(file_path):
+    """Load one combined CSV, returning an empty frame on failure so one bad file doesn't abort the run."""
+    try:
+        df = read_combined_csv(file_path)
+        print(f"Loaded: {file_path.name}")
+        return df
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return pd.DataFrame()
+
 def load_free_recall_data():
     """Load all free recall experiment data."""
     project_root = get_project_root()
     combined_dir = project_root / "combined_data"
     
-    all_data = []
-    csv_files = glob.glob(str(combined_dir / "Free_recall_experiment_*.csv"))
+    csv_files = sorted(combined_dir.glob("Free_recall_experiment_*.csv"))
     
-    for file_path in csv_files:
-        try:
-            df = pd.read_csv(file_path)
-            all_data.append(df)
-            print(f"Loaded: {Path(file_path).name}")
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
+    # Files are independent; pandas' C parser releases the GIL, so reads overlap
+    with ThreadPoolExecutor() as executor:
+        all_data = [df for df in executor.map(load_combined_csv, csv_files) if not df.empty]
     
     if all_data:
-        return pd.concat(all_data, ignore_index=True)
+        data = pd.concat(all_data, ignore_index=True, sort=False)
+        # Each file carries its own single-value categories, which concat widens
+        # back to strings; re-cast so masks and groupbys run on integer codes
+        data['experiment_name'] = data['experiment_name'].astype('category')
+        return data
     else:
         return pd.DataFrame()
 
-def create_free_recall_comparison_plot(data, images_dir):
+def group_stats_by_code(names, values):
+    """
+    Per-category mean, sample std and size via np.bincount on the categorical codes.
+    
+    Matches groupby(..., observed=True).agg(['mean', 'std', 'size']): NaNs are
+    skipped for mean/std but counted in size, and categories stay in sorted order.
+    """
+    codes = names.cat.codes.to_numpy()
+    vals = values.to_numpy(dtype=np.float64)
+    n_groups = len(names.cat.categories)
+    
+    # Rows with a missing name (code -1) are dropped, as groupby does
+    size = np.bincount(codes[codes >= 0], minlength=n_groups)
+    valid = (codes >= 0) & ~np.isnan(vals)
+    codes, vals = codes[valid], vals[valid]
+    count = np.bincount(codes, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(codes, weights=vals, minlength=n_groups) / count
+        # Second sweep over deviations from the group mean (stable, unlike sumsq - mean²)
+        dev = vals - mean[codes]
+        std = np.sqrt(np.bincount(codes, weights=dev * dev, minlength=n_groups) / (count - 1))
+    
+    observed = size > 0
+    return pd.DataFrame({
+        names.name: pd.Categorical.from_codes(np.flatnonzero(observed), dtype=names.dtype),
+        'mean': mean[observed],
+        'std': std[observed],
+        'size': size[observed],
+    })
+
+def aggregate_free_recall_performance(data):
+    """Mean, std and trial count of proportion correct per experiment (one grouped pass)."""
+    if len(data) >= GROUP_STATS_MIN_ROWS:
+        return group_stats_by_code(data['experiment_name'], data['proportion_correct'])
+    return data.groupby('experiment_name', observed=True)['proportion_correct'].agg(['mean', 'std', 'size']).reset_index()
+
+def create_free_recall_comparison_plot(performance_by_experiment, images_dir):
     """Create plot comparing different free recall conditions."""
-    if data.empty:
+    if performance_by_experiment.empty:
         print("No Free Recall data found")
         return
     
-    # Calculate mean performance by experiment
-    performance_by_experiment = data.groupby('experiment_name')['proportion_correct'].agg(['mean', 'std']).reset_index()
+    # Raw arrays once, so matplotlib doesn't convert the Series on every call
+    names = performance_by_experiment['experiment_name'].to_numpy()
+    means = performance_by_experiment['mean'].to_numpy()
+    stds = performance_by_experiment['std'].to_numpy()
     
-    plt.figure(figsize=(12, 6))
+    plt.figure(figsize=(12, 6), layout='constrained')
     
     # Create bar plot
-    bars = plt.bar(performance_by_experiment['experiment_name'], performance_by_experiment['mean'], 
-                   color=['steelblue', 'coral', 'lightgreen', 'gold'], alpha=0.8, 
+    bars = plt.bar(names, means, color=['steelblue', 'coral', 'lightgreen', 'gold'], alpha=0.8,
                    edgecolor='black', linewidth=1)
     
     # Add error bars
-    plt.errorbar(performance_by_experiment['experiment_name'], performance_by_experiment['mean'], 
-                yerr=performance_by_experiment['std'], fmt='none', color='black', capsize=5)
+    plt.errorbar(names, means, yerr=stds, fmt='none', color='black', capsize=5)
     
     # Add value labels
-    for bar, mean in zip(bars, performance_by_experiment['mean']):
+    for bar, mean in zip(bars, means):
         plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.01, 
                 f'{mean:.3f}', ha='center', va='bottom', fontweight='bold')
     
@@ -75,67 +189,59 @@ def create_free_recall_comparison_plot(data, images_dir):
     plt.grid(True, alpha=0.3, axis='y')
     plt.xticks(rotation=45)
     
-    plt.tight_layout()
-    plt.savefig(images_dir / 'free_recall_comparison.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig(images_dir / 'free_recall_comparison.png', dpi=PLOT_DPI)
+    plt.close('all')
     
     return performance_by_experiment
 
-def create_free_recall_individual_plots(data, images_dir):
+def create_free_recall_individual_plots(data, images_dir, performance_by_experiment):
     """Create individual plots for each free recall experiment."""
-    experiments = data['experiment_name'].unique()
+    # Split the metric column once into one array per experiment (no per-experiment mask)
+    values_by_experiment = {name: values.to_numpy() for name, values in
+                            data.groupby('experiment_name', observed=True, sort=False)['proportion_correct']}
+    mean_by_experiment = dict(zip(performance_by_experiment['experiment_name'], performance_by_experiment['mean']))
+    # Shared bin edges: computed once, and the distributions become directly comparable
+    bin_edges = np.histogram_bin_edges(data['proportion_correct'].to_numpy(), bins=15)
     
-    for exp_name in experiments:
-        exp_data = data[data['experiment_name'] == exp_name]
-        
-        if exp_data.empty:
-            continue
-        
+    # One figure reused for every experiment; only the axes contents change
+    fig, ax = plt.subplots(figsize=(10, 6), layout='constrained')
+    
+    for exp_name, values in values_by_experiment.items():
         # Create subfolder for this experiment
         exp_dir = images_dir / exp_name.lower()
         exp_dir.mkdir(exist_ok=True)
         
-        plt.figure(figsize=(10, 6))
+        ax.clear()
         
-        # Create histogram of performance
-        plt.hist(exp_data['proportion_correct'], bins=15, alpha=0.7, color='steelblue', edgecolor='black')
+        # Create histogram of performance (binned in NumPy, drawn as bars)
+        counts, _ = np.histogram(values, bins=bin_edges)
+        ax.bar(bin_edges[:-1], counts, width=np.diff(bin_edges), align='edge',
+               alpha=0.7, color='steelblue', edgecolor='black')
         
         # Add mean line
-        mean_perf = exp_data['proportion_correct'].mean()
-        plt.axvline(mean_perf, color='red', linestyle='--', linewidth=2, 
-                   label=f'Mean: {mean_perf:.3f}')
+        mean_perf = mean_by_experiment[exp_name]
+        ax.axvline(mean_perf, color='red', linestyle='--', linewidth=2, 
+                  label=f'Mean: {mean_perf:.3f}')
         
-        plt.xlabel('Proportion Correct', fontsize=12, fontweight='bold')
-        plt.ylabel('Frequency', fontsize=12, fontweight='bold')
-        plt.title(f'Free Recall - {exp_name} Performance Distribution', fontsize=14, fontweight='bold', pad=20)
+        ax.set_xlabel('Proportion Correct', fontsize=12, fontweight='bold')
+        ax.set_ylabel('Frequency', fontsize=12, fontweight='bold')
+        ax.set_title(f'Free Recall - {exp_name} Performance Distribution', fontsize=14, fontweight='bold', pad=20)
         
-        plt.legend()
-        plt.grid(True, alpha=0.3)
+        ax.legend()
+        ax.grid(True, alpha=0.3)
         
-        plt.tight_layout()
-        plt.savefig(exp_dir / f'{exp_name.lower()}_distribution.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        fig.savefig(exp_dir / f'{exp_name.lower()}_distribution.png', dpi=PLOT_DPI)
+    
+    plt.close(fig)
 
-def create_free_recall_statistics_table(data):
+def create_free_recall_statistics_table(performance_by_experiment):
     """Create detailed statistics table for free recall experiments."""
-    stats = []
-    
-    for exp_name in data['experiment_name'].unique():
-        exp_data = data[data['experiment_name'] == exp_name]
-        
-        if not exp_data.empty:
-            mean_perf = exp_data['proportion_correct'].mean()
-            std_perf = exp_data['proportion_correct'].std()
-            n_trials = len(exp_data)
-            
-            stats.append({
-                'Experiment': exp_name,
-                'Mean Performance': f'{mean_perf:.3f}',
-                'Std Performance': f'{std_perf:.3f}',
-                'N Trials': n_trials
-            })
-    
-    return pd.DataFrame(stats)
+    return pd.DataFrame({
+        'Experiment': performance_by_experiment['experiment_name'],
+        'Mean Performance': performance_by_experiment['mean'].map('{:.3f}'.format),
+        'Std Performance': performance_by_experiment['std'].map('{:.3f}'.format),
+        'N Trials': performance_by_experiment['size']
+    })
 
 def main():
     """Main function to run free recall analyses."""
@@ -151,20 +257,26 @@ def main():
         print("No Free Recall data found. Please run the combine_experiment_data.py script first.")
         return
     
+    # Set style for better-looking plots (only once there is something to plot)
+    plt.rcParams.update(PLOT_RC)
+    
     print(f"Loaded {len(data)} Free Recall records")
-    print(f"Experiments: {data['experiment_name'].unique()}")
+    print(f"Experiments: {list(data['experiment_name'].cat.categories)}")
     print("-" * 50)
     
+    # Aggregate once; shared by the comparison plot and the statistics table
+    performance_by_experiment = aggregate_free_recall_performance(data)
+    
     # Create plots
     print("\nCreating Free Recall comparison plot...")
-    comparison_data = create_free_recall_comparison_plot(data, images_dir)
+    comparison_data = create_free_recall_comparison_plot(performance_by_experiment, images_dir)
     
     print("\nCreating individual experiment plots...")
-    create_free_recall_individual_plots(data, images_dir)
+    create_free_recall_individual_plots(data, images_dir, performance_by_experiment)
     
     # Create statistics table
     print("\nCreating statistics table...")
-    stats_table = create_free_recall_statistics_table(data)
+    stats_table = create_free_recall_statistics_table(performance_by_experiment)
     print("\nFree Recall Statistics:")
     print("=" * 60)
     print(stats_table.to_string(index=False))
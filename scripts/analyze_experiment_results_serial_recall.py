@@ -5,43 +5,159 @@ Creates plots specifically for serial recall experiments.
 """
 
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # batch rendering to PNG only; no GUI windows
 import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
+import os
 from pathlib import Path
-import glob
+from concurrent.futures import ThreadPoolExecutor
 import warnings
 warnings.filterwarnings('ignore')
 
-# Set style for better-looking plots
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+# seaborn's "husl" palette (6 colours), inlined so seaborn itself isn't imported
+HUSL_PALETTE = ['#f77189', '#bb9832', '#50b131', '#36ada4', '#3ba3ec', '#e866f4']
+
+# The parts of the 'seaborn-v0_8' (darkgrid) style these plots actually show,
+# set directly rather than loading and applying the whole style sheet
+PLOT_RC = {
+    'axes.facecolor': '#EAEAF2',
+    'axes.edgecolor': 'white',
+    'axes.linewidth': 0,
+    'axes.grid': True,
+    'axes.axisbelow': True,
+    'axes.labelcolor': '.15',
+    'axes.prop_cycle': plt.cycler(color=HUSL_PALETTE),
+    'grid.color': 'white',
+    'grid.linestyle': '-',
+    'grid.linewidth': 1,
+    'text.color': '.15',
+    'xtick.color': '.15',
+    'ytick.color': '.15',
+    'xtick.major.size': 0,
+    'ytick.major.size': 0,
+    'xtick.major.pad': 7,
+    'ytick.major.pad': 7,
+    'xtick.labelsize': 10,
+    'ytick.labelsize': 10,
+    'legend.fontsize': 10,
+    'legend.frameon': False,
+    'lines.linewidth': 1.75,
+    'lines.markeredgewidth': 0,
+    'lines.solid_capstyle': 'round',
+    'patch.linewidth': 0.3,
+}
+
+# Output resolution for saved PNGs; set PLOT_DPI=300 for print-quality figures
+PLOT_DPI = int(os.environ.get('PLOT_DPI', '150'))
+
+# Columns the analysis consumes, with explicit dtypes (skips dtype inference).
+# Not every file has every column (list_length only exists for some experiments),
+# and list_length may be blank for older files, hence the nullable Int16.
+SERIAL_DTYPES = {'experiment_name': 'category', 'proportion_correct_in_position': 'float32', 'list_length': 'Int16'}
+
+# Above this many rows the per-experiment summary switches from pandas' hash
+# groupby to a single bincount sweep over the categorical codes
+GROUP_STATS_MIN_ROWS = 1_000_000
 
 def get_project_root():
     """Get the project root directory."""
     return Path(__file__).parent.parent
 
+def read_combined_csv(file_path):
+    """
+    Read a combined CSV, memoized as a binary pickle sidecar in combined_data/.cache.
+    
+    The sidecar is reused while it is newer than both the CSV and this script,
+    so editing either one transparently invalidates it. The cache is best-effort:
+    if it cannot be read or written, the CSV is simply parsed as usual.
+    """
+    cache_dir = file_path.parent / ".cache"
+    cache_file = cache_dir / f"{file_path.stem}.pkl"
+    source_mtime = max(file_path.stat().st_mtime, Path(__file__).stat().st_mtime)
+    
+    try:
+        if cache_file.stat().st_mtime >= source_mtime:
+            return pd.read_pickle(cache_file)
+    except Exception:
+        # Missing, or unreadable (e.g. pickled by another pandas version): fall back to the CSV
+        pass
+    
+    df = pd.read_csv(file_path, engine='c', usecols=lambda col: col in SERIAL_DTYPES, dtype=SERIAL_DTYPES)
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        df.to_pickle(cache_file)
+    except OSError:
+        # e.g. a read-only data directory; the parsed frame is still good
+        pass
+    return df
+
+def load_combined_csv(file_path):
+    """Load one combined CSV, returning an empty frame on failure so one bad file doesn't abort the run."""
+    try:
+        df = read_combined_csv(file_path)
+        print(f"Loaded: {file_path.name}")
+        return df
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return pd.DataFrame()
+
 def load_serial_recall_data():
     """Load all serial recall experiment data."""
     project_root = get_project_root()
     combined_dir = project_root / "combined_data"
     
-    all_data = []
-    csv_files = glob.glob(str(combined_dir / "Serial_recall_experiment_*.csv"))
+    csv_files = sorted(combined_dir.glob("Serial_recall_experiment_*.csv"))
     
-    for file_path in csv_files:
-        try:
-            df = pd.read_csv(file_path)
-            all_data.append(df)
-            print(f"Loaded: {Path(file_path).name}")
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
+    # Files are independent; pandas' C parser releases the GIL, so reads overlap
+    with ThreadPoolExecutor() as executor:
+        all_data = [df for df in executor.map(load_combined_csv, csv_files) if not df.empty]
     
     if all_data:
-        return pd.concat(all_data, ignore_index=True)
+        data = pd.concat(all_data, ignore_index=True, sort=False)
+        # Each file carries its own single-value categories, which concat widens
+        # back to strings; re-cast so masks and groupbys run on integer codes
+        data['experiment_name'] = data['experiment_name'].astype('category')
+        return data
     else:
         return pd.DataFrame()
 
+def group_stats_by_code(names, values):
+    """
+    Per-category mean, sample std and size via np.bincount on the categorical codes.
+    
+    Matches groupby(..., observed=True).agg(['mean', 'std', 'size']): NaNs are
+    skipped for mean/std but counted in size, and categories stay in sorted order.
+    """
+    codes = names.cat.codes.to_numpy()
+    vals = values.to_numpy(dtype=np.float64)
+    n_groups = len(names.cat.categories)
+    
+    # Rows with a missing name (code -1) are dropped, as groupby does
+    size = np.bincount(codes[codes >= 0], minlength=n_groups)
+    valid = (codes >= 0) & ~np.isnan(vals)
+    codes, vals = codes[valid], vals[valid]
+    count = np.bincount(codes, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(codes, weights=vals, minlength=n_groups) / count
+        # Second sweep over deviations from the group mean (stable, unlike sumsq - mean²)
+        dev = vals - mean[codes]
+        std = np.sqrt(np.bincount(codes, weights=dev * dev, minlength=n_groups) / (count - 1))
+    
+    observed = size > 0
+    return pd.DataFrame({
+        names.name: pd.Categorical.from_codes(np.flatnonzero(observed), dtype=names.dtype),
+        'mean': mean[observed],
+        'std': std[observed],
+        'size': size[observed],
+    })
+
+def aggregate_serial_recall_performance(data):
+    """Mean, std and trial count of proportion correct in position per experiment (one grouped pass)."""
+    if len(data) >= GROUP_STATS_MIN_ROWS:
+        return group_stats_by_code(data['experiment_name'], data['proportion_correct_in_position'])
+    return data.groupby('experiment_name', observed=True)['proportion_correct_in_position'].agg(['mean', 'std', 'size']).reset_index()
+
 def create_working_memory_capacity_plot(data, images_dir):
     """Create plot showing working memory capacity (list length vs performance)."""
     # Filter for Length experiment data
@@ -54,37 +170,33 @@ def create_working_memory_capacity_plot(data, images_dir):
     # Calculate mean performance by list length
     performance_by_length = length_data.groupby('list_length')['proportion_correct_in_position'].agg(['mean', 'std']).reset_index()
     
-    plt.figure(figsize=(10, 6))
+    # Raw arrays once; shared by the plot calls, the fit and the axis limits
+    x = performance_by_length['list_length'].to_numpy(dtype=float)
+    y_actual = performance_by_length['mean'].to_numpy(dtype=float)
+    y_std = performance_by_length['std'].to_numpy(dtype=float)
+    
+    plt.figure(figsize=(10, 6), layout='constrained')
     
     # Create the line plot
-    plt.plot(performance_by_length['list_length'], performance_by_length['mean'], 
-             'o-', linewidth=2, markersize=8, color='steelblue', label='Mean Performance')
+    plt.plot(x, y_actual, 'o-', linewidth=2, markersize=8, color='steelblue', label='Mean Performance')
     
     # Add error bars
-    plt.errorbar(performance_by_length['list_length'], performance_by_length['mean'], 
-                yerr=performance_by_length['std'], fmt='none', color='steelblue', alpha=0.7)
+    plt.errorbar(x, y_actual, yerr=y_std, fmt='none', color='steelblue', alpha=0.7)
     
-    # Fit a linear line through the points
-    from numpy import polyfit, poly1d
-    import numpy as np
-    
-    # Fit a 1st degree polynomial (linear) to the data
-    z = np.polyfit(performance_by_length['list_length'], performance_by_length['mean'], 1)
-    p = np.poly1d(z)
+    # Fit a linear line through the points; full=True also returns the residual sum of squares
+    z, residuals, *_ = np.polyfit(x, y_actual, 1, full=True)
     
     # Create smooth line for the fitted curve
-    x_smooth = np.linspace(performance_by_length['list_length'].min(), 
-                          performance_by_length['list_length'].max(), 100)
-    y_smooth = p(x_smooth)
+    x_smooth = np.linspace(x.min(), x.max(), 100)
+    y_smooth = z[0] * x_smooth + z[1]
     
     # Plot the fitted line
     plt.plot(x_smooth, y_smooth, '--', color='orange', linewidth=2, alpha=0.8, label='Fitted Line')
     
     # Calculate R² (coefficient of determination)
-    y_pred = p(performance_by_length['list_length'])
-    y_actual = performance_by_length['mean']
-    ss_res = np.sum((y_actual - y_pred) ** 2)
-    ss_tot = np.sum((y_actual - np.mean(y_actual)) ** 2)
+    # residuals is empty for an exact fit (two points), where ss_res is 0
+    ss_res = residuals[0] if residuals.size else 0.0
+    ss_tot = np.sum((y_actual - y_actual.mean()) ** 2)
     r_squared = 1 - (ss_res / ss_tot)
     
     # Create equation string for the legend
@@ -99,9 +211,9 @@ def create_working_memory_capacity_plot(data, images_dir):
     plt.title('Working Memory Capacity', fontsize=14, fontweight='bold', pad=20)
     
     # Set axis limits and ticks
-    plt.xlim(performance_by_length['list_length'].min() - 0.5, performance_by_length['list_length'].max() + 0.5)
+    plt.xlim(x.min() - 0.5, x.max() + 0.5)
     plt.ylim(0, 1.1)
-    plt.xticks(range(int(performance_by_length['list_length'].min()), int(performance_by_length['list_length'].max()) + 1))
+    plt.xticks(range(int(x.min()), int(x.max()) + 1))
     plt.yticks([0, 0.25, 0.5, 0.75, 1.0])
     
     # Add horizontal line at 0.5 for reference
@@ -113,66 +225,30 @@ def create_working_memory_capacity_plot(data, images_dir):
              verticalalignment='bottom')
     
     plt.legend()
-    plt.tight_layout()
-    plt.savefig(images_dir / 'working_memory_capacity.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig(images_dir / 'working_memory_capacity.png', dpi=PLOT_DPI)
+    plt.close('all')
     
     return performance_by_length
 
-def create_serial_recall_comparison_plot(data, images_dir):
+def create_serial_recall_comparison_plot(performance_by_experiment, images_dir):
     """Create plot showing serial recall effects across all conditions."""
-    # Get all serial recall experiment data
-    baseline_data = data[data['experiment_name'] == 'Baseline']
-    tapping_data = data[data['experiment_name'] == 'Tapping']
-    suppression_data = data[data['experiment_name'] == 'Suppression']
-    chunking_data = data[data['experiment_name'] == 'Chunking']
-    length_data = data[data['experiment_name'] == 'Length']
-    
-    # Calculate mean performance for each condition
+    # Look up each condition in the per-experiment aggregate, in a fixed display order
+    stats_by_name = performance_by_experiment.set_index('experiment_name')
     conditions = []
     means = []
     stds = []
     
-    if not baseline_data.empty:
-        baseline_mean = baseline_data['proportion_correct_in_position'].mean()
-        baseline_std = baseline_data['proportion_correct_in_position'].std()
-        conditions.append('Baseline')
-        means.append(baseline_mean)
-        stds.append(baseline_std)
-    
-    if not tapping_data.empty:
-        tapping_mean = tapping_data['proportion_correct_in_position'].mean()
-        tapping_std = tapping_data['proportion_correct_in_position'].std()
-        conditions.append('Tapping')
-        means.append(tapping_mean)
-        stds.append(tapping_std)
-    
-    if not suppression_data.empty:
-        suppression_mean = suppression_data['proportion_correct_in_position'].mean()
-        suppression_std = suppression_data['proportion_correct_in_position'].std()
-        conditions.append('Suppression')
-        means.append(suppression_mean)
-        stds.append(suppression_std)
-    
-    if not chunking_data.empty:
-        chunking_mean = chunking_data['proportion_correct_in_position'].mean()
-        chunking_std = chunking_data['proportion_correct_in_position'].std()
-        conditions.append('Chunking')
-        means.append(chunking_mean)
-        stds.append(chunking_std)
-    
-    if not length_data.empty:
-        length_mean = length_data['proportion_correct_in_position'].mean()
-        length_std = length_data['proportion_correct_in_position'].std()
-        conditions.append('Length')
-        means.append(length_mean)
-        stds.append(length_std)
+    for name in ('Baseline', 'Tapping', 'Suppression', 'Chunking', 'Length'):
+        if name in stats_by_name.index:
+            conditions.append(name)
+            means.append(stats_by_name.at[name, 'mean'])
+            stds.append(stats_by_name.at[name, 'std'])
     
     if not conditions:
         print("No serial recall data found")
         return
     
-    plt.figure(figsize=(12, 6))
+    plt.figure(figsize=(12, 6), layout='constrained')
     
     # Create bar plot with colors for each condition
     colors = ['steelblue', 'coral', 'lightgreen', 'gold', 'purple']
@@ -195,67 +271,59 @@ def create_serial_recall_comparison_plot(data, images_dir):
     plt.ylim(0, max(means) * 1.2)
     plt.grid(True, alpha=0.3, axis='y')
     
-    plt.tight_layout()
-    plt.savefig(images_dir / 'serial_recall_comparison.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig(images_dir / 'serial_recall_comparison.png', dpi=PLOT_DPI)
+    plt.close('all')
     
     return pd.DataFrame({'Condition': conditions, 'Mean': means, 'Std': stds})
 
-def create_serial_recall_individual_plots(data, images_dir):
+def create_serial_recall_individual_plots(data, images_dir, performance_by_experiment):
     """Create individual plots for each serial recall experiment."""
-    experiments = data['experiment_name'].unique()
+    # Split the metric column once into one array per experiment (no per-experiment mask)
+    values_by_experiment = {name: values.to_numpy() for name, values in
+                            data.groupby('experiment_name', observed=True, sort=False)['proportion_correct_in_position']}
+    mean_by_experiment = dict(zip(performance_by_experiment['experiment_name'], performance_by_experiment['mean']))
+    # Shared bin edges: computed once, and the distributions become directly comparable
+    bin_edges = np.histogram_bin_edges(data['proportion_correct_in_position'].to_numpy(), bins=15)
     
-    for exp_name in experiments:
-        exp_data = data[data['experiment_name'] == exp_name]
-        
-        if exp_data.empty:
-            continue
-        
+    # One figure reused for every experiment; only the axes contents change
+    fig, ax = plt.subplots(figsize=(10, 6), layout='constrained')
+    
+    for exp_name, values in values_by_experiment.items():
         # Create subfolder for this experiment
         exp_dir = images_dir / exp_name.lower()
         exp_dir.mkdir(exist_ok=True)
         
-        plt.figure(figsize=(10, 6))
+        ax.clear()
         
-        # Create histogram of performance
-        plt.hist(exp_data['proportion_correct_in_position'], bins=15, alpha=0.7, color='steelblue', edgecolor='black')
+        # Create histogram of performance (binned in NumPy, drawn as bars)
+        counts, _ = np.histogram(values, bins=bin_edges)
+        ax.bar(bin_edges[:-1], counts, width=np.diff(bin_edges), align='edge',
+               alpha=0.7, color='steelblue', edgecolor='black')
         
         # Add mean line
-        mean_perf = exp_data['proportion_correct_in_position'].mean()
-        plt.axvline(mean_perf, color='red', linestyle='--', linewidth=2, 
-                   label=f'Mean: {mean_perf:.3f}')
+        mean_perf = mean_by_experiment[exp_name]
+        ax.axvline(mean_perf, color='red', linestyle='--', linewidth=2, 
+                  label=f'Mean: {mean_perf:.3f}')
         
-        plt.xlabel('Proportion Correct', fontsize=12, fontweight='bold')
-        plt.ylabel('Frequency', fontsize=12, fontweight='bold')
-        plt.title(f'Serial Recall - {exp_name} Performance Distribution', fontsize=14, fontweight='bold', pad=20)
+        ax.set_xlabel('Proportion Correct', fontsize=12, fontweight='bold')
+        ax.set_ylabel('Frequency', fontsize=12, fontweight='bold')
+        ax.set_title(f'Serial Recall - {exp_name} Performance Distribution', fontsize=14, fontweight='bold', pad=20)
         
-        plt.legend()
-        plt.grid(True, alpha=0.3)
+        ax.legend()
+        ax.grid(True, alpha=0.3)
         
-        plt.tight_layout()
-        plt.savefig(exp_dir / f'{exp_name.lower()}_distribution.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        fig.savefig(exp_dir / f'{exp_name.lower()}_distribution.png', dpi=PLOT_DPI)
+    
+    plt.close(fig)
 
-def create_serial_recall_statistics_table(data):
+def create_serial_recall_statistics_table(performance_by_experiment):
     """Create detailed statistics table for serial recall experiments."""
-    stats = []
-    
-    for exp_name in data['experiment_name'].unique():
-        exp_data = data[data['experiment_name'] == exp_name]
-        
-        if not exp_data.empty:
-            mean_perf = exp_data['proportion_correct_in_position'].mean()
-            std_perf = exp_data['proportion_correct_in_position'].std()
-            n_trials = len(exp_data)
-            
-            stats.append({
-                'Experiment': exp_name,
-                'Mean Performance': f'{mean_perf:.3f}',
-                'Std Performance': f'{std_perf:.3f}',
-                'N Trials': n_trials
-            })
-    
-    return pd.DataFrame(stats)
+    return pd.DataFrame({
+        'Experiment': performance_by_experiment['experiment_name'],
+        'Mean Performance': performance_by_experiment['mean'].map('{:.3f}'.format),
+        'Std Performance': performance_by_experiment['std'].map('{:.3f}'.format),
+        'N Trials': performance_by_experiment['size']
+    })
 
 def main():
     """Main function to run serial recall analyses."""
@@ -271,23 +339,29 @@ def main():
         print("No Serial Recall data found. Please run the combine_experiment_data.py script first.")
         return
     
+    # Set style for better-looking plots (only once there is something to plot)
+    plt.rcParams.update(PLOT_RC)
+    
     print(f"Loaded {len(data)} Serial Recall records")
-    print(f"Experiments: {data['experiment_name'].unique()}")
+    print(f"Experiments: {list(data['experiment_name'].cat.categories)}")
     print("-" * 50)
     
+    # Aggregate once; shared by the comparison plot and the statistics table
+    performance_by_experiment = aggregate_serial_recall_performance(data)
+    
     # Create plots
     print("\nCreating Working Memory Capacity plot...")
     wm_data = create_working_memory_capacity_plot(data, images_dir)
     
     print("\nCreating Articulatory Suppression plot...")
-    as_data = create_serial_recall_comparison_plot(data, images_dir)
+    as_data = create_serial_recall_comparison_plot(performance_by_experiment, images_dir)
     
     print("\nCreating individual experiment plots...")
-    create_serial_recall_individual_plots(data, images_dir)
+    create_serial_recall_individual_plots(data, images_dir, performance_by_experiment)
     
     # Create statistics table
     print("\nCreating statistics table...")
-    stats_table = create_serial_recall_statistics_table(data)
+    stats_table = create_serial_recall_statistics_table(performance_by_experiment)
     print("\nSerial Recall Statistics:")
     print("=" * 60)
     print(stats_table.to_string(index=False))
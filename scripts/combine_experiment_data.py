@@ -6,13 +6,47 @@ combining data from all participants into single CSV files for each experiment t
 """
 
 import pandas as pd
+import numpy as np
 import os
-import glob
+import sys
+import time
+from collections import deque
+from functools import lru_cache, partial
+from itertools import islice
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Resolved once at import; every lookup below is relative to it
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 def get_project_root():
     """Get the project root directory."""
-    return Path(__file__).parent.parent
+    return PROJECT_ROOT
+
+@lru_cache(maxsize=None)
+def list_experiment_csv_files():
+    """
+    Bucket every experiment CSV by (experiment type, experiment name).
+    
+    The experiments tree is walked once and the result is cached, so looking up
+    the individual experiments costs no further filesystem calls.
+    
+    Returns:
+        dict: (experiment_type, experiment_name) -> sorted list of CSV file paths
+    """
+    experiments_dir = PROJECT_ROOT / "experiments"
+    csv_files = {}
+    
+    for dirpath, dirnames, filenames in os.walk(experiments_dir):
+        parts = Path(dirpath).relative_to(experiments_dir).parts
+        if len(parts) < 2:
+            continue
+        # Data files live exactly at experiments/<type>/<name>/; don't descend further
+        dirnames.clear()
+        csv_files[parts] = sorted(os.path.join(dirpath, name) for name in filenames
+                                  if name.endswith('.csv') and not name.startswith('.'))
+    
+    return csv_files
 
 def find_csv_files(experiment_type, experiment_name):
     """
@@ -25,81 +59,200 @@ def find_csv_files(experiment_type, experiment_name):
     Returns:
         list: List of CSV file paths
     """
-    project_root = get_project_root()
-    pattern = f"experiments/{experiment_type}/{experiment_name}/*.csv"
-    return glob.glob(str(project_root / pattern))
+    return list_experiment_csv_files().get((experiment_type, experiment_name), [])
+
+# Per-trial bookkeeping columns that are not carried into the combined datasets
+COLUMNS_TO_REMOVE = frozenset({'participant', 'trial_index', 'timestamp', 'condition', 'similarity',
+                               'rate', 'post_phase', 'chunking', 'chunked', 'seed'})
+
+# Participant files read ahead of the one being written (bounds memory to a few files)
+READ_AHEAD = 4
+
+# Label written to the experiment_type column for each experiment folder
+EXPERIMENT_TYPE_LABELS = {
+    'Free recall experiment': 'Free Recall',
+    'Serial recall experiment': 'Serial Recall',
+}
 
-def process_free_recall_data(csv_files, experiment_name):
+# Define experiment configurations
+EXPERIMENTS = {
+    'Free recall experiment': ['Baseline', 'Pause', 'Speed', 'Suppression'],
+    'Serial recall experiment': ['Baseline', 'Chunking', 'Length', 'Suppression', 'Tapping']
+}
+
+# One record per experiment with everything derived from its configuration
+# resolved up front: (experiment_type, experiment_name, type_label, output_name)
+COMBINE_JOBS = tuple(
+    (experiment_type, experiment_name, EXPERIMENT_TYPE_LABELS[experiment_type],
+     f"{experiment_type.replace(' ', '_')}_{experiment_name}_combined.csv")
+    for experiment_type, experiment_names in EXPERIMENTS.items()
+    for experiment_name in experiment_names
+)
+
+def is_up_to_date(output_file, csv_files):
     """
-    Process and combine free recall experiment data.
+    Check whether a combined CSV is newer than everything it is built from.
+    
+    The inputs are the participant files, their folder (whose mtime changes when
+    a file is added or removed) and this script itself.
     
     Args:
+        output_file (Path): Combined CSV for the experiment
         csv_files (list): List of CSV file paths
+    
+    Returns:
+        bool: True if the output exists and no input is newer
+    """
+    try:
+        output_mtime = output_file.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+    inputs = (*csv_files, os.path.dirname(csv_files[0]), __file__)
+    return output_mtime >= max(os.stat(path).st_mtime_ns for path in inputs)
+
+def read_experiment_header(file_path):
+    """
+    Read only the header of one participant CSV, minus the unwanted columns.
+    
+    Args:
+        file_path (str): Path to the CSV file
+    
+    Returns:
+        pd.Index: Column names; empty if the file cannot be read (the full read reports the error)
+    """
+    try:
+        return pd.read_csv(file_path, engine='c', nrows=0, usecols=lambda col: col not in COLUMNS_TO_REMOVE).columns
+    except (OSError, ValueError):
+        return pd.Index([])
+
+def read_experiment_csv(file_path, experiment_name, experiment_type):
+    """
+    Read one participant CSV and prepare it for the combined output.
+    
+    Unwanted columns are skipped at parse time and the experiment metadata is
+    attached, all in one call so the whole per-file transform runs on the
+    reading worker. Only I/O and parse errors are caught;
+    anything else is a bug and propagates.
+    
+    Args:
+        file_path (str): Path to the CSV file
         experiment_name (str): Name of the experiment
+        experiment_type (str): Label for the experiment_type column (e.g., 'Free Recall')
     
     Returns:
-        pd.DataFrame: Combined dataframe
+        tuple: (pd.DataFrame, None) on success, (None, error) if the file could not be read
     """
-    combined_data = []
-    
-    for file_path in csv_files:
-        try:
-            df = pd.read_csv(file_path)
-            
-            # Remove unwanted columns
-            columns_to_remove = ['participant', 'trial_index', 'timestamp', 'condition', 'similarity', 'rate', 'post_phase', 'chunking', 'chunked']
-            df = df.drop(columns=[col for col in columns_to_remove if col in df.columns])
-            
-            # Add experiment metadata
-            df['experiment_type'] = 'Free Recall'
-            df['experiment_name'] = experiment_name
-            
-            combined_data.append(df)
-            print(f"Processed: {file_path}")
-            
-        except Exception as e:
-            print(f"Error processing {file_path}: {e}")
-    
-    if combined_data:
-        return pd.concat(combined_data, ignore_index=True)
-    else:
-        return pd.DataFrame()
-
-def process_serial_recall_data(csv_files, experiment_name):
+    try:
+        df = pd.read_csv(file_path, engine='c', usecols=lambda col: col not in COLUMNS_TO_REMOVE)
+    except (OSError, ValueError) as e:
+        # ValueError covers pandas' ParserError/EmptyDataError and decoding errors
+        return None, e
+    
+    # Add experiment metadata as single-category columns: one shared
+    # string plus an int8 code per row, serialized like plain strings
+    codes = np.zeros(len(df), dtype=np.int8)
+    df['experiment_type'] = pd.Categorical.from_codes(codes, categories=[experiment_type])
+    df['experiment_name'] = pd.Categorical.from_codes(codes, categories=[experiment_name])
+    
+    return df, None
+
+def read_ahead_map(executor, fn, items, depth):
+    """
+    Like executor.map, but with at most `depth` calls in flight or waiting.
+    
+    executor.map submits every item up front, so a slow consumer can end up
+    holding all results at once. Here the next item is only submitted when one
+    is consumed: reads of upcoming files overlap the current write while memory
+    stays bounded to a few files.
     """
-    Process and combine serial recall experiment data.
+    items = iter(items)
+    pending = deque(executor.submit(fn, item) for item in islice(items, depth))
+    while pending:
+        future = pending.popleft()
+        for item in islice(items, 1):
+            pending.append(executor.submit(fn, item))
+        yield future.result()
+
+def process_experiment_data(csv_files, experiment_name, experiment_type, output_file):
+    """
+    Process the data of one experiment and stream it into its combined CSV.
+    
+    Each participant file is appended to the output as soon as it is read, so
+    memory holds one file at a time instead of the whole experiment. If any file
+    cannot be read, the rows of the readable files are still saved and the
+    failures are reported.
     
     Args:
         csv_files (list): List of CSV file paths
         experiment_name (str): Name of the experiment
+        experiment_type (str): Label for the experiment_type column (e.g., 'Free Recall')
+        output_file (Path): Combined CSV to write; only replaced if there are records
     
     Returns:
-        pd.DataFrame: Combined dataframe
+        tuple: (records written, number of files that could not be read)
     """
-    combined_data = []
-    
-    for file_path in csv_files:
-        try:
-            df = pd.read_csv(file_path)
-            
-            # Remove unwanted columns
-            columns_to_remove = ['participant', 'trial_index', 'timestamp', 'condition', 'similarity', 'rate', 'post_phase', 'chunking', 'chunked']
-            df = df.drop(columns=[col for col in columns_to_remove if col in df.columns])
-            
-            # Add experiment metadata
-            df['experiment_type'] = 'Serial Recall'
-            df['experiment_name'] = experiment_name
-            
-            combined_data.append(df)
-            print(f"Processed: {file_path}")
-            
-        except Exception as e:
-            print(f"Error processing {file_path}: {e}")
-    
-    if combined_data:
-        return pd.concat(combined_data, ignore_index=True)
-    else:
-        return pd.DataFrame()
+    n_records = 0
+    n_files = 0
+    failures = []
+    out = None
+    # Rows go to a temp file next to the output, swapped in only once complete, so
+    # a crash mid-write never truncates the last good combined CSV
+    tmp_file = output_file.with_name(output_file.name + '.tmp')
+    
+    # Union of every file's columns in first-seen order, as pd.concat would build
+    # it, so a column missing from some files is never dropped for the others
+    columns = pd.Index(dict.fromkeys(
+        [col for file_path in csv_files for col in read_experiment_header(file_path)]
+        + ['experiment_type', 'experiment_name']))
+    start = time.perf_counter()
+    
+    try:
+        # Files are independent; pandas' C parser releases the GIL, so reads overlap.
+        # Workers hand back finished frames; this thread only appends them in order.
+        read_one = partial(read_experiment_csv, experiment_name=experiment_name, experiment_type=experiment_type)
+        with ThreadPoolExecutor(max_workers=READ_AHEAD) as executor:
+            for file_path, (df, error) in zip(csv_files, read_ahead_map(executor, read_one, csv_files, READ_AHEAD)):
+                if error is not None:
+                    failures.append((file_path, error))
+                    continue
+                if df.empty:
+                    continue
+                
+                if not df.columns.equals(columns):
+                    # Columns this file lacks are left empty
+                    df = df.reindex(columns=columns)
+                
+                write_header = out is None
+                if out is None:
+                    out = open(tmp_file, 'w', newline='', encoding='utf-8')
+                df.to_csv(out, index=False, header=write_header)
+                
+                n_records += len(df)
+                n_files += 1
+    except BaseException:
+        if out is not None:
+            out.close()
+            tmp_file.unlink(missing_ok=True)
+        raise
+    
+    if out is not None:
+        out.close()
+    
+    # One summary line instead of a print per file
+    print(f"Processed {n_files} of {len(csv_files)} files in {time.perf_counter() - start:.2f}s")
+    if failures:
+        print(f"Could not read {len(failures)} file(s):")
+        for file_path, error in failures:
+            print(f"  - {file_path}: {error}")
+    
+    if out is not None:
+        os.replace(tmp_file, output_file)
+        if failures:
+            # Keep the readable rows, but date the output just before the oldest
+            # unreadable file so is_up_to_date() rebuilds (and re-reports) next run
+            oldest_failure = min(os.stat(file_path).st_mtime_ns for file_path, _ in failures)
+            os.utime(output_file, ns=(oldest_failure - 1, oldest_failure - 1))
+    return n_records, len(failures)
 
 def main():
     """Main function to combine all experiment data."""
@@ -112,48 +265,50 @@ def main():
     print(f"Output directory: {output_dir}")
     print("-" * 50)
     
-    # Define experiment configurations
-    experiments = {
-        'Free recall experiment': ['Baseline', 'Pause', 'Speed', 'Suppression'],
-        'Serial recall experiment': ['Baseline', 'Chunking', 'Length', 'Suppression', 'Tapping']
-    }
-    
-    # Process each experiment type
-    for experiment_type, experiment_names in experiments.items():
-        print(f"\nProcessing {experiment_type}...")
-        print("-" * 30)
+    # Process each experiment, announcing each experiment type once
+    current_type = None
+    n_unreadable = 0
+    for experiment_type, experiment_name, type_label, output_name in COMBINE_JOBS:
+        if experiment_type != current_type:
+            current_type = experiment_type
+            print(f"\nProcessing {experiment_type}...")
+            print("-" * 30)
+        
+        print(f"\nProcessing {experiment_name}...")
         
-        for experiment_name in experiment_names:
-            print(f"\nProcessing {experiment_name}...")
-            
-            # Find CSV files for this experiment
-            csv_files = find_csv_files(experiment_type, experiment_name)
-            
-            if not csv_files:
-                print(f"No CSV files found for {experiment_type}/{experiment_name}")
-                continue
-            
-            print(f"Found {len(csv_files)} CSV files:")
-            for file in csv_files:
-                print(f"  - {os.path.basename(file)}")
-            
-            # Process the data based on experiment type
-            if 'Free recall' in experiment_type:
-                combined_df = process_free_recall_data(csv_files, experiment_name)
-            else:
-                combined_df = process_serial_recall_data(csv_files, experiment_name)
-            
-            if not combined_df.empty:
-                # Save individual experiment data
-                output_file = output_dir / f"{experiment_type.replace(' ', '_')}_{experiment_name}_combined.csv"
-                combined_df.to_csv(output_file, index=False)
-                print(f"Saved: {output_file}")
-                print(f"Records: {len(combined_df)}")
-            else:
-                print(f"No data to save for {experiment_name}")
+        # Find CSV files for this experiment
+        csv_files = find_csv_files(experiment_type, experiment_name)
+        
+        if not csv_files:
+            print(f"No CSV files found for {experiment_type}/{experiment_name}")
+            continue
+        
+        print(f"Found {len(csv_files)} CSV files:")
+        for file in csv_files:
+            print(f"  - {os.path.basename(file)}")
+        
+        # Save individual experiment data
+        output_file = output_dir / output_name
+        if is_up_to_date(output_file, csv_files):
+            print(f"Up to date, skipping: {output_file}")
+            continue
+        
+        n_records, n_failed = process_experiment_data(csv_files, experiment_name, type_label, output_file)
+        n_unreadable += n_failed
+        
+        if n_records:
+            print(f"Saved: {output_file}")
+            print(f"Records: {n_records}")
+        else:
+            print(f"No data saved for {experiment_name}")
     
     print(f"\nData combination complete!")
     print(f"All files saved to: {output_dir}")
+    
+    if n_unreadable:
+        print(f"Warning: {n_unreadable} file(s) could not be read; see the errors above")
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())